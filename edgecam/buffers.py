@@ -2,10 +2,11 @@
 # Author: Seunghyeon Kim
 
 
+import sys
 import time
 import asyncio
 import threading
-from typing import Any
+from typing import Any, Callable
 from collections import deque
 
 
@@ -19,6 +20,31 @@ class Empty(Exception):
     pass
 
 
+def sizeof(item: Any) -> int:
+    """ 큐 아이템이 차지하는 메모리 크기(바이트)를 추정한다.
+
+    nbytes 속성을 가진 객체(numpy.ndarray, memoryview 등)는 그 값을, bytes류는 길이를
+    사용한다. 튜플/리스트/사전은 원소(값) 크기의 합이고, 그 외에는 sys.getsizeof를 따른다.
+    """
+    nbytes = getattr(item, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(item, (bytes, bytearray)):
+        return len(item)
+    if isinstance(item, (tuple, list)):
+        return sum(sizeof(x) for x in item)
+    if isinstance(item, dict):
+        return sum(sizeof(x) for x in item.values())
+    return sys.getsizeof(item)
+
+
+def _inspect_bytes(maxbytes: int) -> int:
+    # 최대 바이트는 지정하지 않거나(None) 양의 정수이어야 한다.
+    if maxbytes is None or (isinstance(maxbytes, int) and maxbytes > 0):
+        return maxbytes
+    raise ValueError(f'The maxbytes must be a positive integer or None.')
+
+
 class SyncEvectingQueue():
     """ 고정된 크기를 유지하는 동기식 자동 제거 큐.
 
@@ -37,17 +63,31 @@ class SyncEvectingQueue():
     5-3=2이고, 그 차이만큼 가장 오래된 아이템 4와 3이 순차적으로 제거되어 [0, 1, 2]만
     남는다.
 
+    최대 바이트(maxbytes)를 지정하면 아이템 수와 함께 아이템 크기의 합도 제한한다. 새
+    아이템을 넣을 때 합이 최대 바이트를 넘으면 넘지 않을 때까지 가장 오래된 아이템부터
+    제거한다. 단, 최대 바이트보다 큰 아이템 하나는 단독으로 보관된다. 아이템 크기는
+    sizeof()로 추정하며, sizer로 다른 함수를 지정할 수 있다. nbytes()는 현재 보관 중인
+    아이템 크기의 합을 반환한다.
+
     사용 방법은 표준 큐(queue.Queue)와 같다.
 
     >>> buffer = SyncEvectingQueue(maxsize=1)  # 초기화
     >>> buffer.maxsize = 10  # 최대 크기 변경
+    >>> buffer.maxbytes = 64 * 2**20  # 최대 바이트 변경
     >>> buffer.put(item)  # 아이템 삽입
     >>> item = buffer.get(timeout)  # 아이템 인출
     """
 
-    def __init__(self, maxsize: int=1):
+    def __init__(self,
+                 maxsize: int=1,
+                 maxbytes: int=None,
+                 sizer: Callable[[Any], int]=sizeof):
         self._maxsize = self._inspect(maxsize)
+        self._maxbytes = _inspect_bytes(maxbytes)
+        self._sizer = sizer
         self._queue = deque()
+        self._sizes = deque()
+        self._nbytes = 0
         self.mutex = threading.Lock()
         self.not_empty = threading.Condition(self.mutex)
         self.not_full = threading.Condition(self.mutex)
@@ -60,13 +100,23 @@ class SyncEvectingQueue():
     def maxsize(self, arg: int):
         """ 큐 최대 크기를 지정/변경한다. """
         new = self._inspect(arg)
-        old = self._maxsize
         with self.mutex:
-            if new < old:
-                for _ in range(old - new):
-                    self._get()
+            while len(self._queue) > new:
+                self._get()
             self._maxsize = new
 
+    @property
+    def maxbytes(self) -> int:
+        return self._maxbytes
+
+    @maxbytes.setter
+    def maxbytes(self, arg: int):
+        """ 큐 최대 바이트를 지정/변경한다. """
+        new = _inspect_bytes(arg)
+        with self.mutex:
+            self._maxbytes = new
+            self._evict(0)
+
     @staticmethod
     def _inspect(maxsize: int) -> int:
         # 최대 크기는 반드시 유한한 양의 정수(자연수)이어야 한다.
@@ -78,6 +128,10 @@ class SyncEvectingQueue():
         with self.mutex:
             return len(self._queue)
 
+    def nbytes(self) -> int:
+        with self.mutex:
+            return self._nbytes
+
     def is_full(self) -> bool:
         with self.mutex:
             return len(self._queue) >= self._maxsize
@@ -108,14 +162,25 @@ class SyncEvectingQueue():
 
     def put(self, item: Any):
         """ 아이템을 삽입한다. """
+        size = self._sizer(item)
         with self.mutex:
             if len(self._queue) >= self._maxsize:
                 self._get()  # 자동 제거
-            self._put(item)
+            self._evict(size)
+            self._put(item, size)
             self.not_empty.notify()
 
-    def _put(self, item: Any):
+    def _evict(self, size: int):
+        # 크기 size인 아이템이 들어갈 수 있도록 최대 바이트를 넘는 만큼 제거한다.
+        if self._maxbytes is None:
+            return
+        while len(self._queue) and self._nbytes + size > self._maxbytes:
+            self._get()
+
+    def _put(self, item: Any, size: int):
         self._queue.append(item)
+        self._sizes.append(size)
+        self._nbytes += size
 
     def get(self, timeout: float=None) -> Any:
         """ 아이템을 인출한다. """
@@ -140,6 +205,7 @@ class SyncEvectingQueue():
             return item
 
     def _get(self) -> Any:
+        self._nbytes -= self._sizes.popleft()
         return self._queue.popleft()
 
 
@@ -163,17 +229,28 @@ class AsyncEvectingQueue:
     5-3=2이고, 그 차이만큼 가장 오래된 아이템 4와 3이 순차적으로 제거되어 [0, 1, 2]만
     남는다.
 
+    최대 바이트(maxbytes)를 지정하면 SyncEvectingQueue와 같은 방식으로 아이템 크기의
+    합도 제한한다.
+
     사용 방법은 표준 비동기 큐(asyncio.Queue)와 같다.
 
     >>> buffer = AsyncEvectingQueue(maxsize=1)  # 초기화
     >>> await buffer.set_maxsize(10)  # 최대 크기 변경
+    >>> await buffer.set_maxbytes(64 * 2**20)  # 최대 바이트 변경
     >>> await buffer.put(item)  # 아이템 삽입
     >>> item = await buffer.get(timeout)  # 아이템 인출
     """
 
-    def __init__(self, maxsize: int=1):
+    def __init__(self,
+                 maxsize: int=1,
+                 maxbytes: int=None,
+                 sizer: Callable[[Any], int]=sizeof):
         self._maxsize = self._inspect(maxsize)
+        self._maxbytes = _inspect_bytes(maxbytes)
+        self._sizer = sizer
         self._queue = deque()
+        self._sizes = deque()
+        self._nbytes = 0
         self.mutex = asyncio.Lock()
         self.not_empty = asyncio.Condition(self.mutex)
         self.not_full = asyncio.Condition(self.mutex)
@@ -184,13 +261,21 @@ class AsyncEvectingQueue:
     async def set_maxsize(self, arg: int):
         """ 큐 최대 크기를 지정/변경한다. """
         new = self._inspect(arg)
-        old = self._maxsize
         async with self.mutex:
-            if new < old:
-                for _ in range(old - new):
-                    await self._get()
+            while len(self._queue) > new:
+                await self._get()
             self._maxsize = new
 
+    def get_maxbytes(self) -> int:
+        return self._maxbytes
+
+    async def set_maxbytes(self, arg: int):
+        """ 큐 최대 바이트를 지정/변경한다. """
+        new = _inspect_bytes(arg)
+        async with self.mutex:
+            self._maxbytes = new
+            await self._evict(0)
+
     @staticmethod
     def _inspect(maxsize: int) -> int:
         # 최대 크기는 반드시 유한한 양의 정수(자연수)이어야 한다.
@@ -202,6 +287,10 @@ class AsyncEvectingQueue:
         async with self.mutex:
             return len(self._queue)
 
+    async def nbytes(self) -> int:
+        async with self.mutex:
+            return self._nbytes
+
     async def is_full(self) -> bool:
         async with self.mutex:
             return len(self._queue) >= self._maxsize
@@ -229,14 +318,25 @@ class AsyncEvectingQueue:
 
     async def put(self, item: Any):
         """ 아이템을 삽입한다. """
+        size = self._sizer(item)
         async with self.mutex:
             if len(self._queue) >= self._maxsize:
                 await self._get()  # 자동 제거
-            await self._put(item)
+            await self._evict(size)
+            await self._put(item, size)
             self.not_empty.notify()
 
-    async def _put(self, item: Any):
+    async def _evict(self, size: int):
+        # 크기 size인 아이템이 들어갈 수 있도록 최대 바이트를 넘는 만큼 제거한다.
+        if self._maxbytes is None:
+            return
+        while len(self._queue) and self._nbytes + size > self._maxbytes:
+            await self._get()
+
+    async def _put(self, item: Any, size: int):
         self._queue.append(item)
+        self._sizes.append(size)
+        self._nbytes += size
 
     async def get(self, timeout: float=None) -> Any:
         """ 아이템을 인출한다. """
@@ -259,4 +359,180 @@ class AsyncEvectingQueue:
             return item
 
     async def _get(self) -> Any:
+        self._nbytes -= self._sizes.popleft()
+        return self._queue.popleft()
+
+
+class HybridEvectingQueue:
+    """ 스레드에서 삽입하고 이벤트 루프에서 인출하는 고정 크기 자동 제거 큐.
+
+    캡처/추론은 스레드(SingleThreadTask)에서, 송신은 이벤트 루프(SingleAsyncTask)에서
+    동작할 때 두 영역을 잇는 큐이다. 자동 제거 방식은 SyncEvectingQueue와 같다.
+
+    put()은 어느 스레드에서든 블로킹 없이 호출할 수 있고, get()은 이벤트 루프에서 await
+    한다. 인출을 기다리는 코루틴이 있을 때만 call_soon_threadsafe로 루프를 깨우므로,
+    타임아웃 폴링이나 아이템마다 run_in_executor를 호출하는 방식에 비해 지연과 불필요한
+    깨움이 없다.
+
+    최대 바이트(maxbytes)를 지정하면 SyncEvectingQueue와 같은 방식으로 아이템 크기의
+    합도 제한한다.
+
+    >>> buffer = HybridEvectingQueue(maxsize=1)  # 초기화
+    >>> buffer.put(item)  # 스레드에서 아이템 삽입
+    >>> item = await buffer.get(timeout)  # 이벤트 루프에서 아이템 인출
+    """
+
+    def __init__(self,
+                 maxsize: int=1,
+                 maxbytes: int=None,
+                 sizer: Callable[[Any], int]=sizeof):
+        self._maxsize = self._inspect(maxsize)
+        self._maxbytes = _inspect_bytes(maxbytes)
+        self._sizer = sizer
+        self._queue = deque()
+        self._sizes = deque()
+        self._nbytes = 0
+        self._waiters = deque()
+        self.mutex = threading.Lock()
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, arg: int):
+        """ 큐 최대 크기를 지정/변경한다. """
+        new = self._inspect(arg)
+        with self.mutex:
+            while len(self._queue) > new:
+                self._get()
+            self._maxsize = new
+
+    @property
+    def maxbytes(self) -> int:
+        return self._maxbytes
+
+    @maxbytes.setter
+    def maxbytes(self, arg: int):
+        """ 큐 최대 바이트를 지정/변경한다. """
+        new = _inspect_bytes(arg)
+        with self.mutex:
+            self._maxbytes = new
+            self._evict(0)
+
+    @staticmethod
+    def _inspect(maxsize: int) -> int:
+        # 최대 크기는 반드시 유한한 양의 정수(자연수)이어야 한다.
+        if isinstance(maxsize, int) and maxsize > 0:
+            return maxsize
+        raise ValueError(f'The maxsize must be a positive integer.')
+
+    def qsize(self) -> int:
+        with self.mutex:
+            return len(self._queue)
+
+    def nbytes(self) -> int:
+        with self.mutex:
+            return self._nbytes
+
+    def is_full(self) -> bool:
+        with self.mutex:
+            return len(self._queue) >= self._maxsize
+
+    def is_empty(self) -> bool:
+        with self.mutex:
+            return not len(self._queue)
+
+    def put(self, item: Any):
+        """ 아이템을 삽입한다. 스레드 안전하며 블로킹하지 않는다. """
+        size = self._sizer(item)
+        with self.mutex:
+            if len(self._queue) >= self._maxsize:
+                self._get()  # 자동 제거
+            self._evict(size)
+            self._put(item, size)
+            self._wakeup()
+
+    def _evict(self, size: int):
+        # 크기 size인 아이템이 들어갈 수 있도록 최대 바이트를 넘는 만큼 제거한다.
+        if self._maxbytes is None:
+            return
+        while len(self._queue) and self._nbytes + size > self._maxbytes:
+            self._get()
+
+    def _put(self, item: Any, size: int):
+        self._queue.append(item)
+        self._sizes.append(size)
+        self._nbytes += size
+
+    def _wakeup(self):
+        # 대기 중인 코루틴 하나를 해당 이벤트 루프에서 깨운다.
+        # 이미 취소/타임아웃된 대기자는 건너뛴다.
+        while self._waiters:
+            loop, waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            try:
+                loop.call_soon_threadsafe(self._notify, waiter)
+            except RuntimeError:
+                continue  # 이벤트 루프가 이미 닫혔다.
+            return
+
+    @staticmethod
+    def _notify(waiter: asyncio.Future):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    async def get(self, timeout: float=None) -> Any:
+        """ 아이템을 인출한다. 이벤트 루프에서 호출해야 한다. """
+        if timeout is not None and timeout < 0:
+            raise ValueError('The timeout must be a non-negative number.')
+        loop = asyncio.get_running_loop()
+        endtime = None if timeout is None else loop.time() + timeout
+        while True:
+            with self.mutex:
+                if len(self._queue):
+                    item = self._get()
+                    # 깨어났지만 아이템을 가져가지 못한 대기자가 없도록 다음 대기자에게 넘긴다.
+                    if len(self._queue):
+                        self._wakeup()
+                    return item
+                remaining = None
+                if endtime is not None:
+                    remaining = endtime - loop.time()
+                    # 타임 아웃을 0으로 지정하면 표준 큐의 nowait와 동일하다.
+                    if remaining <= 0:
+                        raise Empty
+                waiter = loop.create_future()
+                entry = (loop, waiter)
+                self._waiters.append(entry)
+            completed = False
+            try:
+                if remaining is None:
+                    await waiter
+                else:
+                    await asyncio.wait_for(waiter, remaining)
+                completed = True
+            except asyncio.TimeoutError:
+                raise Empty
+            finally:
+                waiter.cancel()
+                with self.mutex:
+                    try:
+                        self._waiters.remove(entry)
+                    except ValueError:
+                        pass  # put()이 이미 꺼내갔다.
+                    # 깨어난 뒤 타임아웃/취소되었다면 받은 신호를 다음 대기자에게 넘긴다.
+                    if not completed and len(self._queue):
+                        self._wakeup()
+
+    def get_nowait(self) -> Any:
+        """ 아이템을 즉시 인출한다. 비어있으면 Empty 예외를 발생시킨다. """
+        with self.mutex:
+            if not len(self._queue):
+                raise Empty
+            return self._get()
+
+    def _get(self) -> Any:
+        self._nbytes -= self._sizes.popleft()
         return self._queue.popleft()
@@ -14,7 +14,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rpayload.proto\")\n\nNumpyArray\x12\r\n\x05shape\x18\x01 \x03(\x05\x12\x0c\n\x04\x64\x61ta\x18\x02 \x03(\x02\"w\n\x07Payload\x12\r\n\x05\x66rame\x18\x01 \x01(\x0c\x12\"\n\x05preds\x18\x02 \x03(\x0b\x32\x13.Payload.PredsEntry\x1a\x39\n\nPredsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x1a\n\x05value\x18\x02 \x01(\x0b\x32\x0b.NumpyArray:\x02\x38\x01\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rpayload.proto\"\x88\x02\n\nNumpyArray\x12\r\n\x05shape\x18\x01 \x03(\x05\x12\x0c\n\x04\x64\x61ta\x18\x02 \x03(\x02\x12&\n\x08\x65ncoding\x18\x03 \x01(\x0e\x32\x14.NumpyArray.Encoding\x12\x0b\n\x03raw\x18\x04 \x01(\x0c\x12\r\n\x05scale\x18\x05 \x03(\x02\x12\x0e\n\x06offset\x18\x06 \x03(\x02\x12,\n\x0b\x63ompression\x18\x07 \x01(\x0e\x32\x17.NumpyArray.Compression\".\n\x08\x45ncoding\x12\x0b\n\x07\x46LOAT32\x10\x00\x12\t\n\x05UINT8\x10\x01\x12\n\n\x06UINT16\x10\x02\"+\n\x0b\x43ompression\x12\x08\n\x04NONE\x10\x00\x12\x08\n\x04ZLIB\x10\x01\x12\x08\n\x04ZSTD\x10\x02\"\xbb\x01\n\x07Payload\x12\r\n\x05\x66rame\x18\x01 \x01(\x0c\x12\"\n\x05preds\x18\x02 \x03(\x0b\x32\x13.Payload.PredsEntry\x12\x11\n\tthumbnail\x18\x03 \x01(\x0c\x12\x10\n\x08\x66rame_id\x18\x04 \x01(\x04\x12\r\n\x05width\x18\x05 \x01(\r\x12\x0e\n\x06height\x18\x06 \x01(\r\x1a\x39\n\nPredsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\x1a\n\x05value\x18\x02 \x01(\x0b\x32\x0b.NumpyArray:\x02\x38\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -23,10 +23,14 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   DESCRIPTOR._options = None
   _globals['_PAYLOAD_PREDSENTRY']._options = None
   _globals['_PAYLOAD_PREDSENTRY']._serialized_options = b'8\001'
-  _globals['_NUMPYARRAY']._serialized_start=17
-  _globals['_NUMPYARRAY']._serialized_end=58
-  _globals['_PAYLOAD']._serialized_start=60
-  _globals['_PAYLOAD']._serialized_end=179
-  _globals['_PAYLOAD_PREDSENTRY']._serialized_start=122
-  _globals['_PAYLOAD_PREDSENTRY']._serialized_end=179
+  _globals['_NUMPYARRAY']._serialized_start=18
+  _globals['_NUMPYARRAY']._serialized_end=282
+  _globals['_NUMPYARRAY_ENCODING']._serialized_start=191
+  _globals['_NUMPYARRAY_ENCODING']._serialized_end=237
+  _globals['_NUMPYARRAY_COMPRESSION']._serialized_start=239
+  _globals['_NUMPYARRAY_COMPRESSION']._serialized_end=282
+  _globals['_PAYLOAD']._serialized_start=285
+  _globals['_PAYLOAD']._serialized_end=472
+  _globals['_PAYLOAD_PREDSENTRY']._serialized_start=415
+  _globals['_PAYLOAD_PREDSENTRY']._serialized_end=472
 # @@protoc_insertion_point(module_scope)
\ No newline at end of file
@@ -6,11 +6,16 @@ from abc import ABC, abstractmethod
 import asyncio
 import threading
 import websockets
-from typing import Union, Any
+from websockets.exceptions import ConnectionClosedOK
+from typing import Union, Any, Callable, Tuple
+from concurrent.futures import Executor
 
 import cv2
 import numpy as np
 
+from edgecam.buffers import AsyncEvectingQueue
+from edgecam.vision.transforms import Letterbox, Size, letterbox, resize
+
 
 class FailedOpen(Exception):
     """ 데이터 소스 연결/열기가 실패하였을 때 """
@@ -46,16 +51,29 @@ class VideoReader(Reader):
 
     사용 방법은 cv2.VideoCapture와 유사하나, 필수적인 메소드만 제공한다.
 
+    출력 크기(size)를 지정하면 소스를 열 때 백엔드에 해당 해상도를 요청하고, 백엔드가
+    지원하지 않으면 디코딩 직후 캡처 스레드에서 크기를 조정한다. 입력 크기(imgsz)를
+    지정하면 read_letterboxed()로 표시용 프레임과 함께 레터박스된 모델 입력 이미지를
+    얻을 수 있다. 픽셀 단위의 무거운 작업을 캡처 단계에서 한 번만 수행하여, 이후 추론과
+    직렬화 단계에서 원본 해상도의 프레임을 반복해서 다루지 않도록 한다.
+
     >>> video_reader = VideoReader()
     >>> video_reader.open('rtsp://localhost:554/stream')
     >>> frame = video_reader.read()  # 반복호출 가능
     >>> video_reader.close()
+
+    >>> video_reader = VideoReader(size=(1280, 720), imgsz=640)
+    >>> video_reader.open('rtsp://localhost:554/stream')
+    >>> frame, input, info = video_reader.read_letterboxed()
+    >>> results = info.restore(model.infer(input))  # frame 좌표로 변환
     """
 
-    def __init__(self):
+    def __init__(self, size: Size=None, imgsz: int=None):
         self.mutex = threading.Lock()
         self._cap = cv2.VideoCapture()
         self._cap.setExceptionMode(enable=True)
+        self.size = size
+        self.imgsz = imgsz
 
     def open(self, source: Union[int, str], api_pref: int=cv2.CAP_ANY):
         try:
@@ -63,6 +81,19 @@ class VideoReader(Reader):
                 self._cap.open(source, api_pref)
         except Exception as e:
             raise FailedOpen from e
+        if self.size is not None:
+            self._request_size(self.size)
+
+    def _request_size(self, size: Size):
+        # 장치(웹캠 등) 백엔드는 해상도 변경을 지원하지만, 파일/네트워크 스트림은
+        # 대부분 지원하지 않는다. 실패하더라도 read()에서 크기를 조정하므로 무시한다.
+        with self.mutex:
+            for prop, value in zip(
+                    (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT), size):
+                try:
+                    self._cap.set(prop, value)
+                except cv2.error:
+                    pass
 
     def close(self):
         with self.mutex:
@@ -75,8 +106,30 @@ class VideoReader(Reader):
         except Exception as e:
             raise FailedRead from e
         else:
+            if self.size is not None and frame is not None:
+                frame = resize(frame, self.size)
             return frame
 
+    def read_letterboxed(self) -> Tuple[np.ndarray, np.ndarray, Letterbox]:
+        """ 프레임과 레터박스된 모델 입력 이미지, 좌표 변환 정보를 함께 읽는다. """
+        if self.imgsz is None:
+            raise ValueError('The imgsz must be set to read letterboxed frames.')
+        frame = self.read()
+        input, info = letterbox(frame, self.imgsz)
+        return frame, input, info
+
+
+class _Failed:
+    """ 디코딩 단계에서 발생한 예외를 소비자에게 전달하기 위한 표식. """
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class _Closed(_Failed):
+    """ 수신 단계가 종료되었음을 소비자에게 알리기 위한 표식. """
+    pass
+
 
 class WebsocketReader(Reader):
     """ 웹소켓 소스로부터 데이터를 읽는 비동기 클래스.
@@ -88,13 +141,45 @@ class WebsocketReader(Reader):
     >>> await ws_reader.open('ws://localhost:8000/websocket-endpoint')
     >>> data = await ws_reader.read()  # 반복호출 가능
     >>> await ws_reader.close()
+
+    async for 문으로 반복할 수도 있으며, 연결이 정상 종료되면 반복이 끝난다. 디코더
+    (decoder)를 지정하면 수신한 데이터를 이벤트 루프 밖의 실행기(executor)에서 디코딩한
+    결과를 반환한다. 디코딩 중인 데이터 수는 inflight개로 제한되고, 결과는 수신 순서대로
+    전달된다. 소비자가 늦어지면 maxsize개를 넘는 가장 오래된 결과부터 버린다. 실행기를
+    지정하지 않으면 이벤트 루프의 기본 스레드 풀을 사용한다.
+
+    >>> ws_reader = WebsocketReader(decoder=deserialize,
+    ...                             executor=ProcessPoolExecutor(2), inflight=4)
+    >>> await ws_reader.open('ws://localhost:8000/websocket-endpoint')
+    >>> async for frame, preds in ws_reader:
+    ...     ...
+    >>> await ws_reader.close()
+
+    디코더를 사용하는 반복 중에는 read()를 직접 호출하지 않아야 한다.
     """
 
-    def __init__(self):
+    def __init__(self,
+                 decoder: Callable[[Any], Any]=None,
+                 executor: Executor=None,
+                 inflight: int=2,
+                 maxsize: int=1):
+        if not (isinstance(inflight, int) and inflight > 0):
+            raise ValueError('The inflight must be a positive integer.')
+        if not (isinstance(maxsize, int) and maxsize > 0):
+            raise ValueError('The maxsize must be a positive integer.')
         self.mutex = asyncio.Lock()
         self._ws = None
+        self._decoder = decoder
+        self._executor = executor
+        self._inflight = inflight
+        self._maxsize = maxsize
+        self._tasks = []
+        self._output = None
+        self._closed = None
 
     async def open(self, source: str):
+        await self._stop_pipeline()
+        self._closed = None
         try:
             async with self.mutex:
                 if self._ws is not None and self._ws.open:
@@ -104,6 +189,8 @@ class WebsocketReader(Reader):
             raise FailedOpen from e
 
     async def close(self):
+        # 수신 태스크가 mutex를 점유하고 있을 수 있으므로 먼저 정리한다.
+        await self._stop_pipeline()
         async with self.mutex:
             if self._ws is not None and self._ws.open:
                 await self._ws.close()
@@ -116,4 +203,74 @@ class WebsocketReader(Reader):
         except Exception as e:
             raise FailedRead from e
         else:
-            return data
\ No newline at end of file
+            return data
+
+    def __aiter__(self) -> 'WebsocketReader':
+        return self
+
+    async def __anext__(self) -> Any:
+        if self._decoder is None:
+            try:
+                return await self.read()
+            except FailedRead as e:
+                if isinstance(e.__cause__, ConnectionClosedOK):
+                    raise StopAsyncIteration
+                raise
+        if self._closed is None and not self._tasks:
+            self._start_pipeline()
+        if self._closed is not None:
+            item = self._closed
+        else:
+            item = await self._output.get()
+        if isinstance(item, _Closed):
+            self._closed = item
+            await self._stop_pipeline()
+            if isinstance(item.error.__cause__, ConnectionClosedOK):
+                raise StopAsyncIteration
+            raise item.error
+        if isinstance(item, _Failed):
+            raise FailedRead from item.error
+        return item
+
+    def _start_pipeline(self):
+        pending = asyncio.Queue()
+        slots = asyncio.Semaphore(self._inflight)
+        self._output = AsyncEvectingQueue(self._maxsize)
+        self._tasks = [
+            asyncio.create_task(self._receive(pending, slots)),
+            asyncio.create_task(self._deliver(pending, slots)),
+        ]
+
+    async def _stop_pipeline(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _receive(self, pending: asyncio.Queue, slots: asyncio.Semaphore):
+        # 수신한 데이터를 즉시 실행기에 넘기고, 순서 보장을 위해 퓨처를 차례로 쌓는다.
+        loop = asyncio.get_running_loop()
+        while True:
+            await slots.acquire()
+            try:
+                data = await self.read()
+            except FailedRead as e:
+                await pending.put(_Closed(e))
+                return
+            future = loop.run_in_executor(self._executor, self._decoder, data)
+            await pending.put(future)
+
+    async def _deliver(self, pending: asyncio.Queue, slots: asyncio.Semaphore):
+        # 퓨처를 수신 순서대로 기다려 결과를 출력 큐에 넣는다.
+        while True:
+            future = await pending.get()
+            if isinstance(future, _Closed):
+                await self._output.put(future)
+                return
+            try:
+                item = await future
+            except Exception as e:
+                item = _Failed(e)
+            finally:
+                slots.release()
+            await self._output.put(item)
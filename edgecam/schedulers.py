@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# Author: Seunghyeon Kim
+
+
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict
+
+from edgecam.tasks import SingleThreadTask, NotAlive
+
+
+class Dropped(Exception):
+    """ 같은 스트림의 더 새로운 입력으로 대체되어 추론되지 않았을 때 """
+    pass
+
+
+class _Request:
+
+    def __init__(self, input: Any):
+        self.input = input
+        self.submitted = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result: Any=None, error: BaseException=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+class _Stream:
+
+    def __init__(self, infer: Callable[[Any], Any], weight: float, min_fps: float):
+        self.infer = infer
+        self.weight = weight
+        self.min_fps = min_fps
+        self.request: _Request = None
+        self.vtime = 0.0  # 가상 시간. 작을수록 먼저 처리된다.
+        self.last = -float('inf')  # 최소 추론 속도의 기준이 되는 마지막 추론 시작 시각
+        self.finished = -float('inf')  # 마지막으로 추론을 마친 시각
+        self.history = deque()  # (완료 시각, 대기 시간)
+
+    def deadline(self) -> float:
+        # 최소 추론 속도를 지키기 위해 다음 추론을 시작해야 하는 시각
+        if self.min_fps <= 0:
+            return float('inf')
+        return self.last + 1 / self.min_fps
+
+    def begin(self, now: float):
+        # 마감보다 늦게 시작했다면 늦은 만큼(최대 한 주기) 다음 마감을 앞당겨, 늦음이
+        # 누적되지 않고 평균 추론 속도가 min_fps를 지키도록 한다.
+        if self.deadline() < now:
+            self.last = max(self.deadline(), now - 1 / self.min_fps)
+        else:
+            self.last = now
+
+
+class InferenceScheduler:
+    """ 여러 카메라 스트림이 공유하는 추론을 가중치에 따라 공정하게 배분하는 스케줄러.
+
+    스트림 스레드들이 모델의 infer를 직접 호출하면 먼저 호출한 스트림이 추론을 차지하므로,
+    프레임 속도가 높은 카메라가 조용하지만 중요한 카메라를 굶길 수 있다. 이 스케줄러는
+    하나의 작업 스레드에서 추론을 직렬로 수행하며, 다음 순서로 처리할 스트림을 고른다.
+
+    1. 최소 추론 속도(min_fps)를 지키지 못할 스트림이 있으면 마감 시각이 가장 이른 스트림.
+    2. 그 외에는 가중치 공정 큐잉(weighted fair queuing). 스트림마다 추론할 때마다
+       1/weight씩 증가하는 가상 시간을 두고, 가상 시간이 가장 작은 스트림을 고른다.
+       따라서 경쟁 중인 스트림들은 가중치에 비례하는 추론 횟수를 얻는다.
+
+    스트림 스레드는 보통 결과를 받은 뒤에야 다음 프레임을 보내므로, 방금 추론을 마친
+    스트림은 잠시 대기 중인 입력이 없다. 이때 다른 스트림을 바로 처리하면 스트림들이
+    번갈아 처리되어 가중치가 무시된다. 따라서 가상 시간이 더 작은 스트림이 추론을 마친 지
+    grace초가 지나지 않았다면, 최소 추론 속도에 걸린 스트림이 없는 한 그 스트림의 다음
+    입력을 grace초까지 기다린다. grace는 스트림 스레드가 결과를 받고 다음 입력을 보내기
+    까지의 시간보다 길어야 하며, 입력을 보내지 않는 스트림 때문에 작업 스레드가 쉬는
+    시간은 그 스트림의 추론마다 최대 grace초이다.
+
+    스트림마다 대기 중인 입력은 하나이며, 추론 전에 새 입력이 들어오면 이전 입력은 Dropped
+    예외와 함께 버려진다. stats()는 스트림별로 최근 window초 동안의 실제 추론 속도와
+    평균 대기 시간을 반환한다.
+
+    >>> scheduler = InferenceScheduler()
+    >>> scheduler.register('lobby', PooledYolo(pool).infer, weight=1)
+    >>> scheduler.register('gate', model.infer, weight=3, min_fps=2)
+    >>> scheduler.start()
+    >>> results = scheduler.infer('gate', frame)  # 각 스트림 스레드에서 호출
+    >>> scheduler.stats()  # {'gate': {'fps': 14.8, 'wait': 0.012}, ...}
+    >>> scheduler.stop()
+    """
+
+    def __init__(self, window: float=5.0, grace: float=0.02):
+        if window <= 0:
+            raise ValueError('The window must be a positive number.')
+        if grace < 0:
+            raise ValueError('The grace must be a non-negative number.')
+        self.window = window
+        self.grace = grace
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self._streams: Dict[str, _Stream] = {}
+        self._vclock = 0.0
+        self._task = SingleThreadTask()
+
+    def register(self,
+                 name: str,
+                 infer: Callable[[Any], Any],
+                 weight: float=1.0,
+                 min_fps: float=0.0):
+        """ 스트림을 등록한다. 이미 등록된 스트림은 설정만 변경한다. """
+        if weight <= 0:
+            raise ValueError('The weight must be a positive number.')
+        if min_fps < 0:
+            raise ValueError('The min_fps must be a non-negative number.')
+        with self.mutex:
+            stream = self._streams.get(name)
+            if stream is None:
+                stream = _Stream(infer, weight, min_fps)
+                stream.vtime = self._vclock
+                self._streams[name] = stream
+            else:
+                stream.infer = infer
+                stream.weight = weight
+                stream.min_fps = min_fps
+
+    def unregister(self, name: str):
+        with self.mutex:
+            stream = self._streams.pop(name)
+            if stream.request is not None:
+                stream.request.finish(error=Dropped())
+
+    def is_alive(self) -> bool:
+        return self._task.is_alive()
+
+    def start(self):
+        self._task.start(self._step)
+
+    def stop(self):
+        self._task.stop()
+        # 처리되지 못한 요청은 모두 깨워서 돌려보낸다.
+        with self.mutex:
+            for stream in self._streams.values():
+                if stream.request is not None:
+                    stream.request.finish(error=NotAlive())
+                    stream.request = None
+
+    def infer(self, name: str, input: Any, timeout: float=None) -> Any:
+        """ 스케줄러를 거쳐 추론하고 결과를 반환한다. 결과가 나올 때까지 블로킹한다. """
+        request = _Request(input)
+        with self.mutex:
+            # stop()은 작업 스레드를 멈춘 뒤 mutex 안에서 남은 요청을 정리하므로, 여기서
+            # 확인하면 정리되지 못한 채 남는 요청이 없다.
+            if not self.is_alive():
+                raise NotAlive
+            stream = self._streams[name]
+            if stream.request is not None:
+                stream.request.finish(error=Dropped())
+            elif stream.vtime < self._vclock:
+                # 쉬고 있던 스트림이 밀린 몫을 한꺼번에 차지하지 않도록 한다.
+                stream.vtime = self._vclock
+            stream.request = request
+            self.not_empty.notify()
+        if not request.done.wait(timeout):
+            raise TimeoutError(f'The inference for {name!r} timed out.')
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _select(self, now: float) -> _Stream:
+        ready = [s for s in self._streams.values() if s.request is not None]
+        if not ready:
+            return None
+        overdue = [s for s in ready if s.deadline() <= now]
+        if overdue:
+            return min(overdue, key=_Stream.deadline)
+        return min(ready, key=lambda s: s.vtime)
+
+    def _hold(self, stream: _Stream, now: float) -> float:
+        # 선택된 스트림보다 몫을 덜 받았고 곧 다음 입력을 보낼 스트림을 기다릴 시각
+        if stream.deadline() <= now:
+            return now
+        behind = [s.finished + self.grace for s in self._streams.values()
+                  if s.request is None and s.vtime < stream.vtime
+                  and s.finished + self.grace > now]
+        return max(behind, default=now)
+
+    def _step(self):
+        with self.not_empty:
+            now = time.monotonic()
+            stream = self._select(now)
+            if stream is None:
+                # 중지 요청을 확인할 수 있도록 제한 시간만큼만 기다린다.
+                self.not_empty.wait(0.1)
+                return
+            until = self._hold(stream, now)
+            if until > now:
+                # 몫을 덜 받은 스트림이 곧 보낼 다음 입력을 기다린다.
+                self.not_empty.wait(until - now)
+                return
+            request, stream.request = stream.request, None
+            self._vclock = max(self._vclock, stream.vtime)
+            stream.vtime += 1 / stream.weight
+            stream.begin(now)
+            infer = stream.infer
+        wait = now - request.submitted
+        try:
+            result = infer(request.input)
+        except Exception as e:
+            request.finish(error=e)
+        else:
+            request.finish(result=result)
+        with self.mutex:
+            done = time.monotonic()
+            stream.finished = done
+            stream.history.append((done, wait))
+            while stream.history[0][0] < done - self.window:
+                stream.history.popleft()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """ 스트림별 최근 window초 동안의 추론 속도(fps)와 평균 대기 시간(초). """
+        now = time.monotonic()
+        out = {}
+        with self.mutex:
+            for name, stream in self._streams.items():
+                history = [h for h in stream.history if h[0] >= now - self.window]
+                fps = len(history) / self.window
+                wait = sum(h[1] for h in history) / len(history) if history else 0.0
+                out[name] = {'fps': fps, 'wait': wait}
+        return out
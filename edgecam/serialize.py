@@ -2,43 +2,219 @@
 # Author: Seunghyeon Kim
 
 
+import threading
 import typing
+import zlib
+from collections import OrderedDict
 
 import cv2
 import numpy as np
 
-from edgecam.payload import Payload
+from edgecam.payload import Payload, NumpyArray
+from edgecam.vision.transforms import Size, fit, resize
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 Frame = np.ndarray
 Preds = typing.Dict[str, np.ndarray]
+Quantize = typing.Union[str, typing.Dict[str, str]]
+
+# 양자화 정수 형식. 바이트 순서는 리틀 엔디언으로 고정한다.
+_ENCODINGS = {
+    'uint8': (NumpyArray.UINT8, np.dtype('u1')),
+    'uint16': (NumpyArray.UINT16, np.dtype('<u2')),
+}
+_DTYPES = {encoding: dtype for encoding, dtype in _ENCODINGS.values()}
+_DTYPES[NumpyArray.FLOAT32] = np.dtype('<f4')
+_COMPRESSIONS = {
+    None: NumpyArray.NONE,
+    'zlib': NumpyArray.ZLIB,
+    'zstd': NumpyArray.ZSTD,
+}
 
 
 class EncodeError(Exception):
     pass
 
 
-def serialize(frame: Frame, preds: Preds, ext: str='.jpg') -> bytes:
+class DecodeError(Exception):
+    pass
+
+
+def serialize(frame: Frame,
+              preds: Preds,
+              ext: str='.jpg',
+              quantize: Quantize=None,
+              compress: str=None,
+              thumbnail: Size=None,
+              full: bool=True,
+              frame_id: int=0) -> bytes:
+    """ 프레임과 예측 결과를 Payload 메시지로 직렬화한다.
+
+    quantize로 예측 배열을 정수로 양자화할 수 있다. 'uint8' 또는 'uint16'을 지정하면
+    모든 배열에, {배열 이름: 형식} 사전을 지정하면 배열별로 적용된다. 양자화는 마지막
+    축의 열(예: x1, y1, x2, y2, conf, cls)마다 최솟값(offset)과 간격(scale)을 따로
+    기록하며, 정수값만 가지는 열(추적 ID, 클래스 등)은 간격 1로 손실 없이 저장된다.
+    정수 열의 범위가 지정한 형식에 담기지 않으면 그 배열은 더 넓은 형식(uint16)으로,
+    그래도 담기지 않으면 float32로 저장한다. float32로도 정확히 나타낼 수 없는 정수
+    (절댓값 2**24 초과)가 있으면 EncodeError를 발생시킨다.
+    compress로 'zlib' 또는 'zstd'(zstandard 설치 시)를 지정하면 배열 바이트를 추가로
+    압축한다. deserialize는 저장 방식과 관계없이 원래 형상의 배열을 복원한다.
+
+    thumbnail에 크기(width, height)를 지정하면 비율을 유지한 채 그 안에 들어가는 축소
+    프레임을 함께 싣고, full이 거짓이면 원본 프레임은 싣지 않는다. 원본은 생산자 측
+    FrameRing에 frame_id로 보관해 두었다가 클라이언트가 확대해서 볼 때만 전송하면 된다.
+    예측 결과는 항상 원본 프레임 좌표이며, 원본 크기(width, height)가 함께 기록되므로
+    클라이언트는 축소 프레임 크기와의 비율로 좌표를 변환할 수 있다.
+
+    >>> ring = FrameRing(maxsize=30)
+    >>> ring.put(frame_id, frame)
+    >>> blob = serialize(frame, preds, thumbnail=(480, 270), full=False,
+    ...                  frame_id=frame_id)
+    >>> jpeg = ring.get(frame_id)  # 클라이언트 요청 시
+    """
     payload = Payload()
-    payload.frame = numpy_to_bytes(frame, ext)
+    payload.frame_id = frame_id
+    payload.height, payload.width = frame.shape[:2]
+    if full:
+        payload.frame = numpy_to_bytes(frame, ext)
+    if thumbnail is not None:
+        payload.thumbnail = numpy_to_bytes(resize(frame, fit(frame, thumbnail)), ext)
     for name, array in preds.items():
-        payload.preds[name].shape.extend(array.shape)
-        payload.preds[name].data.extend(array.flatten())
+        dtype = quantize.get(name) if isinstance(quantize, dict) else quantize
+        _encode_array(payload.preds[name], np.asarray(array), dtype, compress)
     blob = payload.SerializeToString()
     return blob
 
 
-def deserialize(blob: bytes) -> typing.Tuple[Frame, Preds]:
+def _encode_array(message: NumpyArray,
+                  array: np.ndarray,
+                  dtype: str=None,
+                  compress: str=None):
+    message.shape.extend(array.shape)
+    if not array.size:
+        return
+    if dtype is None and compress is None:
+        message.data.extend(array.flatten())
+        return
+    if dtype is None:
+        raw = array.astype(_DTYPES[NumpyArray.FLOAT32]).tobytes()
+    else:
+        if dtype not in _ENCODINGS:
+            raise EncodeError(f'Unsupported quantization type: {dtype}.')
+        dtype = _widen(array, dtype)
+        if dtype is None:
+            raw = array.astype(_DTYPES[NumpyArray.FLOAT32]).tobytes()
+        else:
+            message.encoding, qtype = _ENCODINGS[dtype]
+            q, scale, offset = _quantize(array, qtype)
+            message.scale.extend(scale)
+            message.offset.extend(offset)
+            raw = q.tobytes()
+    message.raw, message.compression = _compress(raw, compress)
+
+
+def _columns(array: np.ndarray) -> np.ndarray:
+    cols = array.reshape(-1, array.shape[-1] if array.ndim else 1)
+    return cols.astype(np.float64)
+
+
+def _widen(array: np.ndarray, dtype: str) -> typing.Optional[str]:
+    # 정수 열(추적 ID, 클래스 등)이 간격 1로 담기는 가장 좁은 형식을 요청한 형식부터
+    # 찾는다. 어느 형식에도 담기지 않으면 None(float32로 저장)을 반환한다.
+    cols = _columns(array)
+    integral = np.all(cols == np.round(cols), axis=0)
+    ints = cols[:, integral]
+    if np.any(np.abs(ints) > 2**24):
+        raise EncodeError(
+            'Integer values beyond 2**24 cannot be stored exactly.')
+    span = (ints.max(axis=0) - ints.min(axis=0)).max(initial=0)
+    names = list(_ENCODINGS)
+    for name in names[names.index(dtype):]:
+        if span <= np.iinfo(_ENCODINGS[name][1]).max:
+            return name
+    return None
+
+
+def _quantize(array: np.ndarray, qtype: np.dtype) -> typing.Tuple[np.ndarray, ...]:
+    # 마지막 축의 열마다 [offset, offset + scale * levels] 범위로 선형 양자화한다.
+    levels = np.iinfo(qtype).max
+    cols = _columns(array)
+    lo = cols.min(axis=0).astype(np.float32)
+    span = cols.max(axis=0) - lo
+    integral = np.all(cols == np.round(cols), axis=0) & (span <= levels)
+    scale = np.where(integral, 1.0, span / levels).astype(np.float32)
+    scale[scale <= 0] = 1.0
+    q = np.round((cols - lo) / scale).clip(0, levels).astype(qtype)
+    return q, scale, lo
+
+
+def _compress(raw: bytes, compress: str=None) -> typing.Tuple[bytes, int]:
+    if compress not in _COMPRESSIONS:
+        raise EncodeError(f'Unsupported compression: {compress}.')
+    if compress == 'zlib':
+        packed = zlib.compress(raw)
+    elif compress == 'zstd':
+        if zstandard is None:
+            raise EncodeError('The zstd compression requires zstandard.')
+        packed = zstandard.ZstdCompressor().compress(raw)
+    else:
+        return raw, NumpyArray.NONE
+    # 압축 효과가 없는 작은 배열은 원본 그대로 저장한다.
+    if len(packed) >= len(raw):
+        return raw, NumpyArray.NONE
+    return packed, _COMPRESSIONS[compress]
+
+
+def _decompress(raw: bytes, compression: int) -> bytes:
+    if compression == NumpyArray.ZLIB:
+        return zlib.decompress(raw)
+    if compression == NumpyArray.ZSTD:
+        if zstandard is None:
+            raise DecodeError('The zstd compression requires zstandard.')
+        return zstandard.ZstdDecompressor().decompress(raw)
+    return raw
+
+
+def _decode_array(message: NumpyArray) -> np.ndarray:
+    shape = tuple(message.shape)
+    if not message.raw:
+        data = np.array(message.data, dtype=np.float64)
+        return data.reshape(shape)
+    raw = _decompress(message.raw, message.compression)
+    data = np.frombuffer(raw, dtype=_DTYPES[message.encoding])
+    data = data.astype(np.float64)
+    if message.encoding != NumpyArray.FLOAT32:
+        scale = np.array(message.scale, dtype=np.float32).astype(np.float64)
+        offset = np.array(message.offset, dtype=np.float32).astype(np.float64)
+        data = data.reshape(-1, len(scale)) * scale + offset
+    return data.reshape(shape)
+
+
+def deserialize(blob: bytes, meta: bool=False) -> typing.Tuple:
+    """ Payload 메시지를 프레임과 예측 결과로 역직렬화한다.
+
+    원본 프레임이 없으면 축소 프레임(thumbnail)을 반환한다. 축소 프레임도 없으면 프레임은
+    None이다. meta가 참이면 {'frame_id': ..., 'thumbnail': 축소 프레임 여부,
+    'width': 원본 너비, 'height': 원본 높이}를 추가로 반환한다. 예측 결과는 원본 좌표이다.
+    """
     payload = Payload()
     payload.ParseFromString(blob)
-    frame = payload.frame
-    frame = np.frombuffer(frame, dtype=np.uint8)
-    frame = cv2.imdecode(frame, cv2.IMREAD_ANYCOLOR)
+    is_thumbnail = not payload.frame and bool(payload.thumbnail)
+    frame = payload.thumbnail if is_thumbnail else payload.frame
+    frame = bytes_to_numpy(frame) if frame else None
     preds = {}
     for name, array in payload.preds.items():
-        data = np.array(array.data, dtype=np.float64)
-        data = data.reshape(tuple(array.shape))
-        preds[name] = data
+        preds[name] = _decode_array(array)
+    if meta:
+        return frame, preds, {'frame_id': payload.frame_id,
+                              'thumbnail': is_thumbnail,
+                              'width': payload.width,
+                              'height': payload.height}
     return frame, preds
 
 
@@ -48,4 +224,49 @@ def numpy_to_bytes(frame: np.ndarray, ext: str='.jpg') -> bytes:
         raise EncodeError(
             f'Failed to encode the image to {ext}.')
     buffer = buffer.tobytes()
-    return buffer
\ No newline at end of file
+    return buffer
+
+
+def bytes_to_numpy(buffer: bytes) -> np.ndarray:
+    frame = np.frombuffer(buffer, dtype=np.uint8)
+    frame = cv2.imdecode(frame, cv2.IMREAD_ANYCOLOR)
+    return frame
+
+
+class FrameRing:
+    """ 최근 원본 프레임들을 인코딩된 상태로 보관하는 생산자 측 링 버퍼.
+
+    프레임 ID로 조회하며, 최대 크기(maxsize)를 넘으면 가장 오래된 프레임부터 제거한다.
+    제거되었거나 보관된 적 없는 ID를 조회하면 None을 반환한다. 여러 스레드에서 동시에
+    사용할 수 있다.
+
+    >>> ring = FrameRing(maxsize=30, ext='.jpg')
+    >>> ring.put(frame_id, frame)  # 캡처/추론 스레드
+    >>> jpeg = ring.get(frame_id)  # 클라이언트 요청 처리
+    """
+
+    def __init__(self, maxsize: int=30, ext: str='.jpg'):
+        if not (isinstance(maxsize, int) and maxsize > 0):
+            raise ValueError('The maxsize must be a positive integer.')
+        self._maxsize = maxsize
+        self._ext = ext
+        self._frames = OrderedDict()
+        self.mutex = threading.Lock()
+
+    def put(self, frame_id: int, frame: Frame) -> bytes:
+        """ 프레임을 인코딩하여 보관하고, 인코딩된 바이트를 반환한다. """
+        buffer = numpy_to_bytes(frame, self._ext)
+        with self.mutex:
+            self._frames[frame_id] = buffer
+            self._frames.move_to_end(frame_id)
+            while len(self._frames) > self._maxsize:
+                self._frames.popitem(last=False)
+        return buffer
+
+    def get(self, frame_id: int) -> typing.Optional[bytes]:
+        with self.mutex:
+            return self._frames.get(frame_id)
+
+    def ids(self) -> typing.List[int]:
+        with self.mutex:
+            return list(self._frames)
\ No newline at end of file
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Author: Seunghyeon Kim
+
+
+from typing import Dict, Iterable, Sequence, Union
+
+import numpy as np
+
+
+Results = Dict[str, np.ndarray]
+
+# 박스 배열의 열 구성은 다음과 같다. 신뢰도와 클래스는 항상 마지막 두 열이다.
+#   예측(tracking=False): [x1, y1, x2, y2, conf, cls]
+#   추적(tracking=True):  [x1, y1, x2, y2, id, conf, cls]
+CONF = -2
+CLS = -1
+
+
+def as_boxes(boxes: np.ndarray) -> np.ndarray:
+    """ 검출 결과가 없을 때의 1차원 빈 배열을 (0, 6) 형상으로 맞춘다. """
+    if boxes.ndim == 2:
+        return boxes
+    if boxes.size:
+        raise ValueError('The boxes must be a 2-dimensional array.')
+    return boxes.reshape(0, 6)
+
+
+def select(results: Results, mask: np.ndarray) -> Results:
+    """ 박스 단위 마스크(또는 인덱스)를 결과의 모든 배열에 적용한다. """
+    out = {}
+    for name, array in results.items():
+        out[name] = array[mask] if len(array) else array
+    return out
+
+
+class LabelTable:
+    """ 클래스 ID를 이름으로 변환하는 조회 테이블.
+
+    labels 모듈의 사전(yolo_categories_* 등)으로부터 한 번만 배열을 만들어 두고,
+    검출 결과의 클래스 열 전체를 인덱싱 한 번으로 변환한다.
+
+    >>> table = LabelTable(yolo_categories_eng)
+    >>> names = table(boxes[:, -1])  # array(['person', 'car', ...])
+    >>> ids = table.ids(['person', 'car'])  # array([0, 2])
+    """
+
+    def __init__(self, categories: Dict[int, str], unknown: str=''):
+        size = max(categories) + 1 if categories else 0
+        self.names = np.full(size + 1, unknown, dtype=object)
+        for i, name in categories.items():
+            self.names[i] = name
+        self._ids = {name: i for i, name in categories.items()}
+
+    def __call__(self, classes: np.ndarray) -> np.ndarray:
+        # 범위를 벗어난 ID는 마지막 칸(unknown)으로 보낸다.
+        classes = np.asarray(classes).astype(int)
+        last = len(self.names) - 1
+        classes = np.where((classes >= 0) & (classes < last), classes, last)
+        return self.names[classes]
+
+    def ids(self, names: Iterable[str]) -> np.ndarray:
+        return np.array([self._ids[name] for name in names], dtype=int)
+
+
+def class_mask(boxes: np.ndarray,
+               allow: Sequence[int]=None,
+               deny: Sequence[int]=None) -> np.ndarray:
+    """ 허용 목록에 있고 거부 목록에 없는 클래스의 박스를 선택하는 마스크. """
+    boxes = as_boxes(boxes)
+    classes = boxes[:, CLS]
+    mask = np.ones(len(boxes), dtype=bool)
+    if allow is not None:
+        mask &= np.isin(classes, allow)
+    if deny is not None:
+        mask &= ~np.isin(classes, deny)
+    return mask
+
+
+def conf_mask(boxes: np.ndarray,
+              threshold: Union[float, Dict[int, float]]) -> np.ndarray:
+    """ 신뢰도가 임계값 이상인 박스를 선택하는 마스크.
+
+    임계값은 모든 클래스에 공통인 실수이거나 {클래스 ID: 임계값} 사전일 수 있다.
+    사전에 없는 클래스는 임계값 0을 적용한다.
+    """
+    boxes = as_boxes(boxes)
+    if not isinstance(threshold, dict):
+        return boxes[:, CONF] >= threshold
+    size = max(threshold) + 2 if threshold else 1
+    table = np.zeros(size)
+    for i, value in threshold.items():
+        table[i] = value
+    classes = boxes[:, CLS].astype(int)
+    classes = np.where((classes >= 0) & (classes < size - 1), classes, size - 1)
+    return boxes[:, CONF] >= table[classes]
+
+
+def box_area(boxes: np.ndarray) -> np.ndarray:
+    boxes = as_boxes(boxes)
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+def box_centers(boxes: np.ndarray) -> np.ndarray:
+    boxes = as_boxes(boxes)
+    return (boxes[:, 0:2] + boxes[:, 2:4]) / 2
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """ 두 박스 배열 (N, 4+), (M, 4+) 사이의 IoU 행렬 (N, M). """
+    a, b = as_boxes(a), as_boxes(b)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    union = box_area(a)[:, None] + box_area(b)[None, :] - inter
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(union > 0, inter / union, 0.0)
+
+
+def points_in_polygon(points: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """ 점 배열 (N, 2)의 각 점이 다각형 (K, 2) 안에 있는지 여부 (N,).
+
+    짝수-홀수 규칙(ray casting)을 모든 점과 변에 대해 한 번에 계산한다.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=np.float64)
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    crosses = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xs = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return np.count_nonzero(crosses & (x < xs), axis=1) % 2 == 1
+
+
+def zone_masks(boxes: np.ndarray, zones: Sequence[np.ndarray]) -> np.ndarray:
+    """ 박스 중심점이 각 구역(다각형) 안에 있는지 여부 (구역 수, 박스 수). """
+    centers = box_centers(boxes)
+    return np.array([points_in_polygon(centers, zone) for zone in zones],
+                    dtype=bool).reshape(len(zones), len(centers))
+
+
+def count_in_zones(boxes: np.ndarray,
+                   zones: Sequence[np.ndarray],
+                   num_classes: int=None) -> np.ndarray:
+    """ 구역별 박스 수를 센다.
+
+    num_classes가 지정되면 구역별/클래스별 개수 (구역 수, num_classes)를,
+    아니면 구역별 개수 (구역 수,)를 반환한다.
+    """
+    boxes = as_boxes(boxes)
+    masks = zone_masks(boxes, zones)
+    if num_classes is None:
+        return masks.sum(axis=1)
+    onehot = np.zeros((len(boxes), num_classes), dtype=int)
+    classes = boxes[:, CLS].astype(int)
+    valid = (classes >= 0) & (classes < num_classes)
+    onehot[np.flatnonzero(valid), classes[valid]] = 1
+    return masks.astype(int) @ onehot
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# Author: Seunghyeon Kim
+
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+from edgecam.skippers import StepSkipper
+
+
+Image = np.ndarray
+Results = Dict[str, np.ndarray]
+
+
+class Propagator(ABC):
+    """ 인터페이스. 키프레임의 예측 결과를 이후 프레임으로 전파(propagation). """
+
+    @abstractmethod
+    def update(self, input: Image, results: Results):
+        """ 키프레임의 입력 이미지와 예측 결과를 기록한다. """
+        pass
+
+    @abstractmethod
+    def propagate(self, input: Image) -> Results:
+        """ 마지막 키프레임의 예측 결과를 현재 프레임으로 전파한다. """
+        pass
+
+    @property
+    @abstractmethod
+    def ready(self) -> bool:
+        """ 전파할 키프레임 결과가 있는지 여부. """
+        pass
+
+
+def _shift(results: Results, deltas: np.ndarray) -> Results:
+    # 박스별 이동량(dx1, dy1, dx2, dy2)을 박스와 키포인트에 더한다.
+    # 키포인트는 박스 중심의 이동량만큼 평행 이동시킨다.
+    out = {}
+    for name, array in results.items():
+        out[name] = array.copy()
+    boxes = out.get('boxes')
+    if boxes is None or not len(boxes):
+        return out
+    boxes[:, :4] += deltas
+    kptss = out.get('kptss')
+    if kptss is not None and len(kptss) == len(boxes):
+        center = (deltas[:, :2] + deltas[:, 2:]) / 2
+        kptss[..., :2] += center[:, None, :]
+    return out
+
+
+class VelocityPropagator(Propagator):
+    """ 등속도 모델로 추적 박스를 외삽(extrapolation)하는 전파기.
+
+    연속한 두 키프레임에서 같은 추적 ID를 가진 박스의 좌표 변화량을 프레임 간격으로 나누어
+    프레임당 속도를 구하고, 키프레임 사이의 프레임에서는 경과 프레임 수만큼 박스를 이동시킨다.
+    추적 ID가 없는 박스(tracking=False)나 새로 등장한 박스는 속도가 0으로 간주되어
+    마지막 위치를 그대로 유지한다.
+
+    연산은 박스 배열에 대한 NumPy 산술뿐이므로 CPU 비용이 거의 없다.
+
+    >>> propagator = VelocityPropagator()
+    >>> propagator.update(keyframe, results)  # 키프레임
+    >>> results = propagator.propagate(frame)  # 사이 프레임
+    """
+
+    def __init__(self):
+        self._results = None
+        self._ids = np.empty(0)
+        self._velocity = np.empty((0, 4))
+        self._elapsed = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._results is not None
+
+    def update(self, input: Image, results: Results):
+        boxes = results['boxes']
+        gap = self._elapsed + 1
+        velocity = np.zeros((len(boxes), 4))
+        # 추적 결과는 [x1, y1, x2, y2, id, conf, cls]의 7열로 구성된다.
+        if len(boxes) and boxes.shape[1] == 7:
+            ids = boxes[:, 4]
+            if self._results is not None and len(self._ids):
+                prev = self._results['boxes']
+                _, cur_idx, prev_idx = np.intersect1d(
+                    ids, self._ids, assume_unique=True, return_indices=True)
+                velocity[cur_idx] = (
+                    boxes[cur_idx, :4] - prev[prev_idx, :4]) / gap
+        else:
+            ids = np.empty(0)
+        self._results = results
+        self._ids = ids
+        self._velocity = velocity
+        self._elapsed = 0
+
+    def propagate(self, input: Image) -> Results:
+        self._elapsed += 1
+        return _shift(self._results, self._velocity * self._elapsed)
+
+
+class OpticalFlowPropagator(Propagator):
+    """ 희소 광학 흐름(sparse optical flow)으로 박스를 이동시키는 전파기.
+
+    각 박스 내부에 격자 형태의 표본 점을 배치하고, 직전 프레임과 현재 프레임 사이에서
+    피라미드 루카스-카나데(cv2.calcOpticalFlowPyrLK) 방법으로 점들을 추적한다. 추적에
+    성공한 점들의 이동량 중앙값만큼 박스를 평행 이동시킨다. 추적 ID가 필요하지 않으므로
+    tracking=False인 모델에도 사용할 수 있다.
+
+    >>> propagator = OpticalFlowPropagator(grid=3)
+    >>> propagator.update(keyframe, results)  # 키프레임
+    >>> results = propagator.propagate(frame)  # 사이 프레임
+    """
+
+    def __init__(self, grid: int=3, margin: float=0.2, win_size: int=21):
+        if not (isinstance(grid, int) and grid > 0):
+            raise ValueError('The grid must be a positive integer.')
+        if not 0 <= margin < 0.5:
+            raise ValueError('The margin must be in the range [0, 0.5).')
+        self._grid = grid
+        self._margin = margin
+        self._lk_params = dict(
+            winSize=(win_size, win_size),
+            maxLevel=3,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self._results = None
+        self._gray = None
+        self._offsets = np.empty((0, 4))
+
+    @property
+    def ready(self) -> bool:
+        return self._results is not None
+
+    @staticmethod
+    def _to_gray(input: Image) -> np.ndarray:
+        if input.ndim == 3:
+            return cv2.cvtColor(input, cv2.COLOR_BGR2GRAY)
+        return input
+
+    def _sample(self, boxes: np.ndarray) -> np.ndarray:
+        # 박스 가장자리(margin)를 제외한 내부 영역에 grid x grid 표본 점을 배치한다.
+        # 반환 형상은 (박스 수 * grid * grid, 1, 2)이다.
+        steps = np.linspace(self._margin, 1 - self._margin, self._grid)
+        u, v = np.meshgrid(steps, steps)
+        u, v = u.ravel(), v.ravel()
+        x1, y1, x2, y2 = (boxes[:, i:i+1] for i in range(4))
+        xs = x1 + (x2 - x1) * u
+        ys = y1 + (y2 - y1) * v
+        points = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2)
+        return points.astype(np.float32)
+
+    def update(self, input: Image, results: Results):
+        self._results = results
+        self._gray = self._to_gray(input)
+        self._offsets = np.zeros((len(results['boxes']), 4))
+
+    def propagate(self, input: Image) -> Results:
+        gray = self._to_gray(input)
+        boxes = self._results['boxes']
+        if len(boxes):
+            current = boxes[:, :4] + self._offsets
+            prev_pts = self._sample(current)
+            next_pts, status, _ = cv2.calcOpticalFlowPyrLK(
+                self._gray, gray, prev_pts, None, **self._lk_params)
+            n = self._grid * self._grid
+            motion = (next_pts - prev_pts).reshape(-1, n, 2).astype(np.float64)
+            valid = status.reshape(-1, n).astype(bool)
+            motion[~valid] = np.nan
+            with np.errstate(all='ignore'):
+                # 추적에 모두 실패한 박스는 NaN이 되므로 0으로 대체한다.
+                median = np.nan_to_num(np.nanmedian(motion, axis=1))
+            self._offsets += np.tile(median, 2)
+        self._gray = gray
+        return _shift(self._results, self._offsets)
+
+
+class KeyframeInferer:
+    """ 키프레임에서만 모델 추론을 수행하고 나머지 프레임은 결과를 전파하는 클래스.
+
+    StepSkipper로 키프레임 여부를 판단한다. 키프레임에서는 모델(infer 메소드 제공)의
+    추론 결과를 그대로 반환하고 전파기를 갱신하며, 스킵되는 프레임에서는 전파기가 추정한
+    결과를 반환한다. 따라서 모든 프레임에 예측 결과가 제공되면서도 추론 비용은 단위 간격
+    크기(stepsize)의 역수 수준으로 줄어든다.
+
+    >>> model = Yolo()
+    >>> model.load('yolov8n.pt', tracking=True)
+    >>> inferer = KeyframeInferer(model, stepsize=3)
+    >>> results = inferer.infer(frame)  # 매 프레임 호출
+    """
+
+    def __init__(self, model: Any, stepsize: int, propagator: Propagator=None):
+        if propagator is None:
+            propagator = VelocityPropagator()
+        self._model = model
+        self._skipper = StepSkipper(stepsize)
+        self._propagator = propagator
+
+    @property
+    def stepsize(self) -> int:
+        return self._skipper.stepsize
+
+    @stepsize.setter
+    def stepsize(self, stepsize: int):
+        self._skipper.stepsize = stepsize
+
+    def infer(self, input: Image) -> Results:
+        is_skip = next(self._skipper)
+        if is_skip and self._propagator.ready:
+            return self._propagator.propagate(input)
+        results = self._model.infer(input)
+        self._propagator.update(input, results)
+        return results
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# Author: Seunghyeon Kim
+
+
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from edgecam.vision.postprocess import (
+    CONF, CLS, box_centers, box_iou, points_in_polygon)
+
+
+Image = np.ndarray
+Results = Dict[str, np.ndarray]
+Rect = Tuple[int, int, int, int]  # (x1, y1, x2, y2)
+
+
+class Region:
+    """ 프레임 내의 관심 영역(ROI). 사각형 또는 다각형으로 정의한다.
+
+    사각형은 (x1, y1, x2, y2)로, 다각형은 꼭짓점 좌표 [(x, y), ...]로 지정한다.
+    추론에는 다각형을 감싸는 최소 사각형(bounds)을 잘라서 사용하고, 잘라낸 영역에서
+    검출된 박스 중 중심점이 다각형 밖에 있는 박스는 결과에서 제외한다.
+
+    >>> region = Region((0, 540, 1920, 1080))  # 사각형
+    >>> region = Region([(100, 900), (1800, 900), (1200, 300), (700, 300)])  # 다각형
+    """
+
+    def __init__(self, shape: Union[Rect, Sequence[Tuple[float, float]]]):
+        array = np.asarray(shape, dtype=np.float64)
+        if array.shape == (4,):
+            x1, y1, x2, y2 = array
+            array = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]])
+            self.is_rect = True
+        elif array.ndim == 2 and array.shape[1] == 2 and len(array) >= 3:
+            self.is_rect = False
+        else:
+            raise ValueError(
+                'The shape must be a rectangle (x1, y1, x2, y2) '
+                'or a polygon with at least 3 vertices.')
+        self.polygon = array
+
+    def bounds(self, width: int, height: int) -> Rect:
+        """ 프레임 크기로 잘라낸 다각형의 외접 사각형. """
+        x1, y1 = np.floor(self.polygon.min(axis=0)).astype(int)
+        x2, y2 = np.ceil(self.polygon.max(axis=0)).astype(int)
+        x1, x2 = max(0, int(x1)), min(width, int(x2))
+        y1, y2 = max(0, int(y1)), min(height, int(y2))
+        return x1, y1, x2, y2
+
+    def contains(self, points: np.ndarray) -> np.ndarray:
+        """ 점 배열 (N, 2)의 각 점이 영역 안에 있는지 여부 (N,)를 반환한다. """
+        if self.is_rect:
+            (x1, y1), (x2, y2) = self.polygon[0], self.polygon[2]
+            x, y = points[:, 0], points[:, 1]
+            return (x >= x1) & (x < x2) & (y >= y1) & (y < y2)
+        return points_in_polygon(points, self.polygon)
+
+
+def tiles(rect: Rect, size: int, overlap: float=0.2) -> List[Rect]:
+    """ 사각형 영역을 서로 겹치는 정사각형 타일들로 분할한다.
+
+    타일 간 간격은 size * (1 - overlap)이고, 마지막 타일은 영역의 끝에 맞춰진다.
+    영역이 타일보다 작은 축은 분할하지 않는다.
+    """
+    if not (isinstance(size, int) and size > 0):
+        raise ValueError('The size must be a positive integer.')
+    if not 0 <= overlap < 1:
+        raise ValueError('The overlap must be in the range [0, 1).')
+    x1, y1, x2, y2 = rect
+    step = max(1, int(size * (1 - overlap)))
+
+    def starts(lo: int, hi: int) -> List[int]:
+        if hi - lo <= size:
+            return [lo]
+        out = list(range(lo, hi - size, step))
+        out.append(hi - size)
+        return out
+
+    return [(x, y, min(x + size, x2), min(y + size, y2))
+            for y in starts(y1, y2) for x in starts(x1, x2)]
+
+
+def nms(boxes: np.ndarray, iou: float=0.5) -> np.ndarray:
+    """ 클래스별 비최대 억제(NMS). 남길 박스의 인덱스를 신뢰도 내림차순으로 반환한다.
+
+    박스 배열의 열 구성은 [x1, y1, x2, y2, (id), conf, cls]이다.
+    """
+    if not len(boxes):
+        return np.empty(0, dtype=int)
+    # 클래스마다 좌표를 충분히 떨어뜨려 서로 다른 클래스끼리는 겹치지 않도록 한다.
+    xyxy = boxes[:, :4] + boxes[:, CLS:] * (boxes[:, :4].max() + 1)
+    order = np.argsort(-boxes[:, CONF], kind='stable')
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        ious = box_iou(xyxy[i:i+1], xyxy[rest])[0]
+        order = rest[ious <= iou]
+    return np.array(keep, dtype=int)
+
+
+class RegionInferer:
+    """ 관심 영역만 잘라서 추론하고 결과를 전체 프레임 좌표로 되돌리는 클래스.
+
+    Yolo.infer는 프레임 전체를 모델 입력 크기로 축소하므로, 고해상도 카메라에서는
+    하늘이나 벽처럼 불필요한 영역에 연산을 낭비하고 작은 객체를 놓치기 쉽다. 이 클래스는
+    스트림별로 지정한 관심 영역만 잘라내고, 타일 크기(tile)가 지정되면 영역을 다시 겹치는
+    타일로 나누어 원본 해상도 그대로 모델에 전달한다. 잘라낸 이미지들은 infer_batch로
+    한 번에 추론하며, 검출된 박스와 키포인트는 전체 프레임 좌표로 변환된 뒤 타일 간
+    중복을 제거하기 위해 NMS를 거친다.
+
+    타일 간에는 추적이 이어지지 않으므로, 반환되는 박스는 항상 추적 ID가 없는
+    [x1, y1, x2, y2, conf, cls]의 6열이다. 추적 모델의 콜백이 일부 타일에 ID를 붙이더라도
+    ID 열은 제거된다.
+
+    model은 Yolo/YoloPose처럼 infer_batch와 결과 키 목록(keys)을 가져야 한다. 잘라낼
+    영역이 없을 때도 같은 키를 가진 빈 결과를 반환한다.
+
+    >>> model = Yolo()
+    >>> model.load('yolov8n.pt')
+    >>> inferer = RegionInferer(model, [Region((0, 1080, 3840, 2160))], tile=640)
+    >>> results = inferer.infer(frame)
+    """
+
+    def __init__(self,
+                 model: Any,
+                 regions: Sequence[Region],
+                 tile: int=None,
+                 overlap: float=0.2,
+                 iou: float=0.5):
+        if not len(regions):
+            raise ValueError('At least one region is required.')
+        self._model = model
+        self.regions = list(regions)
+        self.tile = tile
+        self.overlap = overlap
+        self.iou = iou
+
+    def crops(self, width: int, height: int) -> List[Rect]:
+        """ 추론에 사용할 잘라낼 사각형 목록. """
+        rects = []
+        for region in self.regions:
+            rect = region.bounds(width, height)
+            if rect[2] <= rect[0] or rect[3] <= rect[1]:
+                continue
+            if self.tile is None:
+                rects.append(rect)
+            else:
+                rects.extend(tiles(rect, self.tile, self.overlap))
+        return rects
+
+    def infer(self, input: Image) -> Results:
+        height, width = input.shape[:2]
+        rects = self.crops(width, height)
+        if not rects:
+            return {name: np.array([]) for name in self._model.keys}
+        outs = self._model.infer_batch(
+            [input[y1:y2, x1:x2] for x1, y1, x2, y2 in rects])
+
+        merged = {name: [] for name in outs[0]}
+        for (x1, y1, _, _), out in zip(rects, outs):
+            if not len(out['boxes']):
+                continue
+            for name, array in out.items():
+                array = array.copy()
+                if name == 'boxes':
+                    if array.shape[1] == 7:
+                        # 추적 ID 열을 제거하여 모든 타일의 열 구성을 맞춘다.
+                        array = np.delete(array, 4, axis=1)
+                    array[:, [0, 2]] += x1
+                    array[:, [1, 3]] += y1
+                else:
+                    array[..., 0] += x1
+                    array[..., 1] += y1
+                merged[name].append(array)
+        if not merged['boxes']:
+            return {name: np.array([]) for name in merged}
+        results = {name: np.concatenate(arrays) for name, arrays in merged.items()}
+
+        # 다각형 영역의 외접 사각형에서 검출되었지만 영역 밖에 있는 박스를 제거한다.
+        boxes = results['boxes']
+        centers = box_centers(boxes)
+        inside = np.zeros(len(boxes), dtype=bool)
+        for region in self.regions:
+            inside |= region.contains(centers)
+        keep = np.flatnonzero(inside)
+        keep = keep[nms(boxes[keep], self.iou)]
+        return {name: array[keep] for name, array in results.items()}
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Author: Seunghyeon Kim
+
+
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+
+from edgecam.vision.postprocess import points_in_polygon
+
+
+# 기록 배열의 열 구성. (x, y)는 박스 중심이다.
+COLUMNS = ('time', 'x', 'y', 'w', 'h', 'conf', 'cls')
+T, X, Y, W, H, CONF, CLS = range(len(COLUMNS))
+
+
+class TrackHistory:
+    """ 추적 ID별 최근 이력을 NumPy 링 버퍼에 보관하는 저장소.
+
+    Yolo(tracking=True)의 박스 배열 [x1, y1, x2, y2, id, conf, cls]을 프레임마다 받아
+    추적 ID별로 (time, x, y, w, h, conf, cls) 행을 기록한다. 모든 이력은 하나의 배열
+    (슬롯 수, capacity, 7)에 저장되며, 추적 ID는 슬롯에 대응된다. 추적마다 최근
+    capacity개의 행만 유지하고, 마지막 관측 후 ttl초가 지난 추적은 슬롯을 반납한다.
+    따라서 장시간 실행해도 메모리는 동시에 존재하는 추적 수에 비례하는 수준으로 유지된다.
+
+    구역/시간 조건 질의는 모든 추적의 이력에 대해 한 번에 계산한다.
+
+    >>> history = TrackHistory(capacity=300, ttl=5.0)
+    >>> history.update(results['boxes'])  # 매 프레임 호출
+    >>> rows = history.track(track_id)  # (k, 7), 시간순
+    >>> ids = history.in_zone(polygon, seconds=10)  # 최근 10초간 구역에 들어온 추적
+    >>> ids, seconds = history.dwell()  # 추적별 체류 시간
+    """
+
+    def __init__(self, capacity: int=300, ttl: float=5.0, slots: int=64):
+        if not (isinstance(capacity, int) and capacity > 0):
+            raise ValueError('The capacity must be a positive integer.')
+        if ttl <= 0:
+            raise ValueError('The ttl must be a positive number.')
+        if not (isinstance(slots, int) and slots > 0):
+            raise ValueError('The slots must be a positive integer.')
+        self.capacity = capacity
+        self.ttl = ttl
+        self._data = np.zeros((slots, capacity, len(COLUMNS)))
+        self._head = np.zeros(slots, dtype=int)
+        self._count = np.zeros(slots, dtype=int)
+        self._first = np.full(slots, np.inf)
+        self._last = np.full(slots, -np.inf)
+        self._ids = np.full(slots, -1, dtype=np.int64)
+        self._slots: Dict[int, int] = {}
+        self._free = list(range(slots - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def ids(self) -> np.ndarray:
+        """ 현재 보관 중인 추적 ID. """
+        return self._ids[self._active()]
+
+    def _active(self) -> np.ndarray:
+        return self._ids >= 0
+
+    def _grow(self):
+        old = len(self._ids)
+        new = old * 2
+        self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+        self._head = np.concatenate([self._head, np.zeros(old, dtype=int)])
+        self._count = np.concatenate([self._count, np.zeros(old, dtype=int)])
+        self._first = np.concatenate([self._first, np.full(old, np.inf)])
+        self._last = np.concatenate([self._last, np.full(old, -np.inf)])
+        self._ids = np.concatenate([self._ids, np.full(old, -1, dtype=np.int64)])
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def _slot(self, track_id: int, t: float) -> int:
+        slot = self._slots.get(track_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._slots[track_id] = slot
+            self._ids[slot] = track_id
+            self._head[slot] = 0
+            self._count[slot] = 0
+            self._first[slot] = t
+        return slot
+
+    def update(self, boxes: np.ndarray, t: float=None):
+        """ 한 프레임의 추적 박스를 기록하고, 만료된 추적을 제거한다. """
+        if t is None:
+            t = time.monotonic()
+        # 추적 ID가 없는 결과(빈 배열 또는 6열)는 기록하지 않는다.
+        if boxes.ndim == 2 and len(boxes) and boxes.shape[1] == 7:
+            slots = np.array([self._slot(int(i), t) for i in boxes[:, 4]])
+            rows = np.empty((len(boxes), len(COLUMNS)))
+            rows[:, T] = t
+            rows[:, X] = (boxes[:, 0] + boxes[:, 2]) / 2
+            rows[:, Y] = (boxes[:, 1] + boxes[:, 3]) / 2
+            rows[:, W] = boxes[:, 2] - boxes[:, 0]
+            rows[:, H] = boxes[:, 3] - boxes[:, 1]
+            rows[:, CONF] = boxes[:, 5]
+            rows[:, CLS] = boxes[:, 6]
+            self._data[slots, self._head[slots]] = rows
+            self._head[slots] = (self._head[slots] + 1) % self.capacity
+            self._count[slots] = np.minimum(self._count[slots] + 1, self.capacity)
+            self._last[slots] = t
+        self.evict(t)
+
+    def evict(self, now: float=None) -> np.ndarray:
+        """ 마지막 관측 후 ttl초가 지난 추적을 제거하고, 제거된 추적 ID를 반환한다. """
+        if now is None:
+            now = time.monotonic()
+        expired = np.flatnonzero(self._active() & (self._last < now - self.ttl))
+        ids = self._ids[expired]
+        for track_id, slot in zip(ids.tolist(), expired.tolist()):
+            del self._slots[track_id]
+            self._free.append(slot)
+        self._ids[expired] = -1
+        self._count[expired] = 0
+        self._first[expired] = np.inf
+        self._last[expired] = -np.inf
+        return ids
+
+    def track(self, track_id: int) -> np.ndarray:
+        """ 추적 하나의 이력 (k, 7)을 시간순으로 반환한다. """
+        slot = self._slots.get(track_id)
+        if slot is None:
+            return np.empty((0, len(COLUMNS)))
+        count, head = self._count[slot], self._head[slot]
+        if count < self.capacity:
+            return self._data[slot, :count].copy()
+        return np.roll(self._data[slot], -head, axis=0)
+
+    def _valid(self) -> np.ndarray:
+        # (슬롯 수, capacity) 마스크. 링 버퍼가 가득 차기 전에는 앞쪽 count개만 유효하다.
+        return np.arange(self.capacity)[None, :] < self._count[:, None]
+
+    def in_zone(self,
+                polygon: np.ndarray,
+                seconds: float=None,
+                now: float=None) -> np.ndarray:
+        """ 최근 seconds초 동안 중심점이 다각형 안에 있었던 추적 ID. """
+        mask = self._valid()
+        if seconds is not None:
+            if now is None:
+                now = time.monotonic()
+            mask &= self._data[..., T] >= now - seconds
+        slots, index = np.nonzero(mask)
+        points = self._data[slots, index][:, [X, Y]]
+        inside = points_in_polygon(points, polygon)
+        return self._ids[np.unique(slots[inside])]
+
+    def dwell(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ 보관 중인 추적별 (ID 배열, 처음 관측부터 마지막 관측까지의 시간).
+
+        링 버퍼에서 밀려난 이력과 관계없이 추적이 처음 관측된 시각부터 계산한다.
+        """
+        active = np.flatnonzero(self._active())
+        return self._ids[active], self._last[active] - self._first[active]
+
+    def latest(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ 보관 중인 추적별 (ID 배열, 마지막 행 배열 (N, 7)). """
+        active = np.flatnonzero(self._active())
+        index = (self._head[active] - 1) % self.capacity
+        return self._ids[active], self._data[active, index].copy()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Author: Seunghyeon Kim
+
+
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+
+Image = np.ndarray
+Results = Dict[str, np.ndarray]
+Size = Tuple[int, int]  # (width, height)
+
+
+def resize(image: Image, size: Size) -> Image:
+    """ 이미지를 지정된 크기(width, height)로 변경한다. 크기가 같으면 그대로 반환한다. """
+    height, width = image.shape[:2]
+    if (width, height) == tuple(size):
+        return image
+    # 축소에는 INTER_AREA가 에일리어싱이 적고, 확대에는 INTER_LINEAR가 빠르다.
+    shrink = size[0] < width or size[1] < height
+    interpolation = cv2.INTER_AREA if shrink else cv2.INTER_LINEAR
+    return cv2.resize(image, tuple(size), interpolation=interpolation)
+
+
+def fit(image: Image, bounds: Size) -> Size:
+    """ 비율을 유지한 채 bounds(width, height) 안에 들어가는 가장 큰 크기. """
+    height, width = image.shape[:2]
+    scale = min(bounds[0] / width, bounds[1] / height)
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+class Letterbox:
+    """ 레터박스 변환 정보. 모델 입력 좌표를 원본 이미지 좌표로 되돌릴 때 사용한다. """
+
+    def __init__(self, scale: float, pad: Tuple[int, int], shape: Tuple[int, int]):
+        self.scale = scale
+        self.pad = pad  # (left, top)
+        self.shape = shape  # 원본 이미지의 (height, width)
+
+    def restore(self, results: Results) -> Results:
+        """ 레터박스 이미지에 대한 예측 결과를 원본 이미지 좌표로 변환한다. """
+        left, top = self.pad
+        height, width = self.shape
+        out = {}
+        for name, array in results.items():
+            array = array.copy()
+            if len(array):
+                if name == 'boxes':
+                    array[:, [0, 2]] = (array[:, [0, 2]] - left) / self.scale
+                    array[:, [1, 3]] = (array[:, [1, 3]] - top) / self.scale
+                    array[:, [0, 2]] = array[:, [0, 2]].clip(0, width)
+                    array[:, [1, 3]] = array[:, [1, 3]].clip(0, height)
+                else:
+                    array[..., 0] = (array[..., 0] - left) / self.scale
+                    array[..., 1] = (array[..., 1] - top) / self.scale
+            out[name] = array
+        return out
+
+
+def letterbox(image: Image,
+              imgsz: int=640,
+              stride: int=32,
+              auto: bool=True,
+              color: Tuple[int, int, int]=(114, 114, 114)) -> Tuple[Image, Letterbox]:
+    """ 비율을 유지한 채 크기를 조정하고 테두리를 채워 모델 입력 이미지를 만든다.
+
+    긴 변이 imgsz가 되도록 축소한 뒤, auto가 참이면 각 변을 stride의 배수가 되도록만
+    채우고(최소 사각형), 거짓이면 imgsz x imgsz 정사각형으로 채운다. ultralytics의
+    LetterBox와 같은 방식이므로, 결과 이미지를 모델에 넣으면 추가 크기 조정이 일어나지
+    않는다.
+
+    >>> input, info = letterbox(frame, 640)
+    >>> results = info.restore(model.infer(input))
+    """
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    if auto:
+        pad_w, pad_h = (-new_w) % stride, (-new_h) % stride
+    else:
+        pad_w, pad_h = imgsz - new_w, imgsz - new_h
+    left, top = pad_w // 2, pad_h // 2
+    image = resize(image, (new_w, new_h))
+    image = cv2.copyMakeBorder(
+        image, top, pad_h - top, left, pad_w - left,
+        cv2.BORDER_CONSTANT, value=color)
+    return image, Letterbox(scale, (left, top), (height, width))
@@ -3,7 +3,8 @@
 
 
 import gc
-from typing import Dict
+import weakref
+from typing import Dict, List
 
 import torch
 import numpy as np
@@ -14,8 +15,31 @@ Image = np.ndarray
 Results = Dict[str, np.ndarray]
 
 
+def offload(model: ultralytics.YOLO):
+    """ GPU에 올라간 모델을 CPU로 옮기고 CUDA 캐시를 비운다. """
+    if next(model.parameters()).device.type == 'cuda':
+        model.to('cpu')
+        torch.cuda.empty_cache()
+
+
+def nbytes(model: ultralytics.YOLO) -> int:
+    """ 모델 파라미터와 버퍼가 차지하는 메모리 크기(바이트). """
+    seen = set()
+    total = 0
+    for tensor in [*model.parameters(), *model.buffers()]:
+        # 가중치를 공유하는 텐서는 한 번만 센다.
+        if tensor.data_ptr() in seen:
+            continue
+        seen.add(tensor.data_ptr())
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
 class Yolo:
 
+    # infer/infer_batch가 반환하는 결과의 키
+    keys = ('boxes',)
+
     def __init__(self):
         self._model = None
         self._infer = None
@@ -46,16 +70,26 @@ class Yolo:
             boxes = out[0].boxes.data.cpu().numpy()
         return {'boxes': boxes}
 
-    def release(self):
-        if next(self._model.parameters()).device.type == 'cuda':
-            self._model.to('cpu')
-            torch.cuda.empty_cache()
+    def infer_batch(self, inputs: List[Image]) -> List[Results]:
+        # 타일/관심 영역처럼 서로 독립적인 이미지들을 한 번에 추론한다.
+        # 이미지 간 연속성이 없으므로 추적은 적용하지 않는다.
+        outs = self._model.predict(inputs, verbose=False)
+        return [{'boxes': out.boxes.data.cpu().numpy()} for out in outs]
+
+    def release(self) -> bool:
+        """ 모델을 해제하고, 실제로 메모리에서 회수되었는지 여부를 반환한다. """
+        ref = weakref.ref(self._model)
+        offload(self._model)
         del self._model
         gc.collect()
+        # 다른 곳에서 모델을 참조하고 있다면 회수되지 않는다.
+        return ref() is None
 
 
 class YoloPose(Yolo):
 
+    keys = ('boxes', 'kptss')
+
     def load(self, pt: str='yolov8n-pose.pt', tracking: bool=False):
         self.load(pt, tracking)
     
@@ -68,3 +102,8 @@ class YoloPose(Yolo):
             boxes = out[0].boxes.data.cpu().numpy()
             kptss = out[0].keypoints.data.cpu().numpy()
         return {"boxes": boxes, "kptss": kptss}
+
+    def infer_batch(self, inputs: List[Image]) -> List[Results]:
+        outs = self._model.predict(inputs, verbose=False)
+        return [{'boxes': out.boxes.data.cpu().numpy(),
+                 'kptss': out.keypoints.data.cpu().numpy()} for out in outs]
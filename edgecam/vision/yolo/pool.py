@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# Author: Seunghyeon Kim
+
+
+import gc
+import inspect
+import threading
+import weakref
+from typing import Any, Callable, Dict, List
+
+import torch
+import ultralytics
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+try:
+    from ultralytics.utils import YAML
+    _load_yaml = YAML.load
+except ImportError:  # YAML 클래스가 없는 이전 버전
+    from ultralytics.utils import yaml_load as _load_yaml
+
+from edgecam.vision.yolo.models import (
+    Image, Results, Yolo, YoloPose, nbytes, offload)
+
+
+class NotLoaded(Exception):
+    """ 풀에 로드되지 않은 모델을 참조할 때 """
+    pass
+
+
+class _Entry:
+    """ 풀에 로드된 모델 하나와 그 모델을 공유하는 스트림들의 공용 상태. """
+
+    def __init__(self, pt: str, model: ultralytics.YOLO):
+        self.pt = pt
+        self.model = model
+        self.refs = 0
+        # ultralytics 예측기(predictor)는 스레드 안전하지 않으므로 추론을 직렬화한다.
+        self.lock = threading.Lock()
+
+
+class ModelPool:
+    """ 여러 스트림이 하나의 로드된 모델을 공유하도록 관리하는 레지스트리.
+
+    스트림마다 Yolo.load를 호출하면 같은 가중치가 스트림 수만큼 메모리에 올라간다. 이
+    풀은 이름(기본값은 가중치 경로)별로 모델을 한 번만 로드하고 참조 횟수를 센다. 마지막
+    참조가 해제되면 모델을 메모리에서 내리고, 실제로 회수되었는지 여부를 반환한다.
+
+    swap()은 새 가중치를 먼저 로드(및 워밍업)한 뒤, 모델 참조만 잠금 안에서 교체한다.
+    따라서 교체 중에도 스트림들은 기존 모델로 계속 추론하며 프레임이 누락되지 않는다.
+
+    >>> pool = ModelPool()
+    >>> model = PooledYolo(pool)  # 스트림마다 생성
+    >>> model.load('yolov8n.pt', tracking=True)
+    >>> results = model.infer(frame)
+    >>> pool.memory()  # {'yolov8n.pt': 12837252}
+    >>> pool.swap('yolov8n.pt', 'yolov8s.pt', warmup=frame)
+    >>> model.release()
+    """
+
+    def __init__(self, loader: Callable[[str], ultralytics.YOLO]=ultralytics.YOLO):
+        self._loader = loader
+        self.mutex = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+
+    def names(self) -> List[str]:
+        with self.mutex:
+            return list(self._entries)
+
+    def acquire(self, name: str, pt: str=None) -> _Entry:
+        """ 모델을 참조한다. 처음 참조되는 이름이면 가중치를 로드한다. """
+        with self.mutex:
+            entry = self._entries.get(name)
+            if entry is None:
+                pt = name if pt is None else pt
+                entry = _Entry(pt, self._loader(pt))
+                self._entries[name] = entry
+            entry.refs += 1
+            return entry
+
+    def release(self, name: str) -> bool:
+        """ 참조를 해제한다. 마지막 참조였다면 모델을 내리고 회수 여부를 반환한다. """
+        with self.mutex:
+            entry = self._get(name)
+            entry.refs -= 1
+            if entry.refs > 0:
+                return False
+            del self._entries[name]
+        with entry.lock:
+            ref = weakref.ref(entry.model)
+            entry.model = None
+        return self._free(ref)
+
+    def swap(self, name: str, pt: str, warmup: Image=None) -> bool:
+        """ 공유 중인 모델을 새 가중치로 교체하고, 이전 모델의 회수 여부를 반환한다.
+
+        warmup 이미지가 주어지면 교체 전에 새 모델로 한 번 추론하여 첫 추론 지연을 없앤다.
+        스트림별 추적기는 공유 모델이 아닌 PooledYolo에 있으므로 교체 후에도 이어서 동작한다.
+        """
+        with self.mutex:
+            entry = self._get(name)
+        model = self._loader(pt)
+        if warmup is not None:
+            model.predict(warmup, verbose=False)
+        with entry.lock:
+            ref = weakref.ref(entry.model)
+            entry.model, entry.pt = model, pt
+        del model
+        return self._free(ref)
+
+    def memory(self) -> Dict[str, int]:
+        """ 로드된 모델별 파라미터/버퍼 메모리 크기(바이트). """
+        with self.mutex:
+            entries = list(self._entries.items())
+        out = {}
+        for name, entry in entries:
+            with entry.lock:
+                out[name] = nbytes(entry.model)
+        return out
+
+    def refs(self, name: str) -> int:
+        with self.mutex:
+            return self._get(name).refs
+
+    def _get(self, name: str) -> _Entry:
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise NotLoaded(f'The model {name!r} is not loaded.') from None
+
+    @staticmethod
+    def _free(ref: weakref.ref) -> bool:
+        # 약한 참조만 남긴 상태에서 수집하여, 모델이 실제로 회수되었는지 확인한다.
+        model = ref()
+        if model is not None:
+            offload(model)
+        del model
+        gc.collect()
+        return ref() is None
+
+
+class PooledYolo(Yolo):
+    """ ModelPool의 모델을 공유하는 스트림별 Yolo.
+
+    사용 방법은 Yolo와 같다. 모델 가중치는 풀에서 공유하고, 추적기(tracker)는
+    인스턴스(스트림)마다 따로 가진다. 공유 모델에서는 항상 predict만 수행하고, 그 검출
+    결과를 이 스트림의 추적기에 직접 넣어 추적 ID를 붙인다. 공유 모델의 예측기에는 추적
+    콜백을 등록하지 않으므로, 추적하지 않는 스트림이나 infer_batch에는 영향이 없다.
+    같은 이유로 예측기에 훅을 거는 추적기(tracktrack)와 검출 모델의 특징을 쓰는
+    ReID(with_reid: True, model: auto)는 지원하지 않는다.
+
+    >>> model = PooledYolo(pool, tracker='bytetrack.yaml')
+    >>> model.load('yolov8n.pt', tracking=True)
+    """
+
+    def __init__(self, pool: ModelPool, tracker: str='bytetrack.yaml'):
+        self._pool = pool
+        self._name = None
+        self._entry = None
+        self._tracker_cfg = tracker
+        self._tracker = None
+        self.tracking = False
+
+    @property
+    def _model(self) -> ultralytics.YOLO:
+        return None if self._entry is None else self._entry.model
+
+    def load(self, pt: str='yolov8n.pt', tracking: bool=False, name: str=None):
+        if self._entry is not None:
+            self.release()
+        self._name = pt if name is None else name
+        self._entry = self._pool.acquire(self._name, pt)
+        try:
+            self.tracking = tracking
+        except Exception:
+            # 추적기 설정이 잘못되었다면 참조를 남기지 않는다.
+            self.release()
+            raise
+
+    @property
+    def tracking(self) -> bool:
+        return self._tracking
+
+    @tracking.setter
+    def tracking(self, turn_on: bool):
+        self._tracking = turn_on
+        self._tracker = self._new_tracker() if turn_on else None
+        self._infer = self._track if turn_on else self._predict
+
+    def _new_tracker(self) -> Any:
+        # ultralytics가 model.track()에서 추적기를 만드는 방식과 같다.
+        cfg = IterableSimpleNamespace(**_load_yaml(check_yaml(self._tracker_cfg)))
+        if cfg.tracker_type not in TRACKER_MAP:
+            raise ValueError(f'Unsupported tracker type: {cfg.tracker_type}.')
+        tracker = TRACKER_MAP[cfg.tracker_type]
+        # 공유 예측기에 훅을 거는 추적기나 검출 모델의 특징을 쓰는 ReID는 지원하지 않는다.
+        if hasattr(tracker, 'setup_predictor') or hasattr(tracker, 'compute_frame_extras'):
+            raise ValueError(
+                f'The tracker {cfg.tracker_type!r} is not supported by pooled models.')
+        if getattr(cfg, 'with_reid', False) and getattr(cfg, 'model', 'auto') == 'auto':
+            raise ValueError(
+                'ReID with detector features (model: auto) is not supported '
+                'by pooled models. Set a ReID model path instead.')
+        if self._entry is not None:
+            cfg.device = self._entry.model.device
+        # 이전 버전의 추적기는 frame_rate 인자를 받고, 최신 버전은 args만 받는다.
+        if 'frame_rate' in inspect.signature(tracker).parameters:
+            return tracker(args=cfg, frame_rate=30)
+        return tracker(args=cfg)
+
+    def _predict(self, input: Image) -> Any:
+        with self._entry.lock:
+            return self._entry.model.predict(input, verbose=False)
+
+    def _track(self, input: Image) -> Any:
+        out = self._predict(input)
+        # 추적기는 이 스트림 전용이므로 공유 모델의 잠금 밖에서 갱신한다. 검출이 없는
+        # 프레임도 넣어야 추적기가 잃어버린 추적의 경과 프레임을 센다.
+        result = out[0]
+        tracks = self._tracker.update(result.boxes.cpu().numpy(), result.orig_img)
+        if not len(tracks):
+            return out
+        # 추적 결과의 마지막 열은 검출 결과의 인덱스이다.
+        device = result.boxes.data.device
+        result = result[tracks[:, -1].astype(int)]
+        result.update(boxes=torch.as_tensor(tracks[:, :-1], device=device))
+        out[0] = result
+        return out
+
+    def infer_batch(self, inputs: List[Image]) -> List[Results]:
+        with self._entry.lock:
+            return super().infer_batch(inputs)
+
+    def release(self) -> bool:
+        name, self._name = self._name, None
+        self._entry = None
+        self._tracker = None
+        return self._pool.release(name)
+
+
+class PooledYoloPose(PooledYolo, YoloPose):
+    """ ModelPool의 모델을 공유하는 스트림별 YoloPose. """
+
+    def load(self, pt: str='yolov8n-pose.pt', tracking: bool=False, name: str=None):
+        super().load(pt, tracking, name)